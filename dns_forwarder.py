@@ -0,0 +1,833 @@
+# DNS Forwarder: todas as etapas do desafio em um único módulo, selecionadas por --mode
+# (os arquivos stepX_dns_forwarder.py iniciam este módulo no modo da etapa correspondente)
+
+# Importação de bibliotecas necessárias
+import socket  # Para comunicação de rede via sockets UDP
+import argparse  # Para processar argumentos de linha de comando
+import struct  # Para manipulação de dados binários (serialização/deserialização)
+import time  # Para gerenciar a validade (TTL) das entradas do cache
+import asyncio  # Para atender várias consultas simultaneamente
+import logging  # Para mensagens de depuração (desligadas por padrão)
+import os  # Para criar processos (fork) quando --workers > 1
+import signal  # Para encerrar os processos filhos
+import sys  # Para esvaziar a saída padrão antes de encerrar um processo filho
+import traceback  # Para exibir o erro de um processo filho antes de encerrá-lo
+import secrets  # Para sortear os IDs de transação usados no upstream (gerador imprevisível)
+from collections import OrderedDict  # Para o cache LRU (ordem de uso recente)
+from itertools import islice  # Para percorrer só as entradas mais antigas do cache
+
+# Mensagens por pacote são de nível DEBUG: só são formatadas quando --debug está ativo
+log = logging.getLogger(__name__)
+
+# Formatos binários pré-compilados (evita reprocessar a string de formato a cada pacote)
+_HDR = struct.Struct('!HHHHHH')  # Cabeçalho: 6 campos de 16 bits
+_QT = struct.Struct('!HH')        # Tipo e classe da pergunta
+_ANS = struct.Struct('!HHIH')     # Tipo, classe, TTL e comprimento dos dados da resposta
+_U16 = struct.Struct('!H')        # Inteiro de 16 bits (ID da transação, ponteiros)
+_U32 = struct.Struct('!I')        # Inteiro de 32 bits (TTL, campo MINIMUM do SOA)
+
+MAX_POINTER_HOPS = 16   # Máximo de ponteiros de compressão seguidos ao ler um nome
+MAX_NAME_LENGTH = 255   # Tamanho máximo de um nome DNS no pacote (RFC 1035, Seção 3.1)
+
+# Cache LRU global para armazenar respostas DNS: as entradas menos usadas ficam no início
+# Formato: {pergunta no formato do pacote (bytes): (resposta, expiração, expiração final)}
+# As expirações são instantes absolutos de time.monotonic(), imunes a ajustes do relógio.
+# Entre a expiração e a expiração final a entrada está "vencida": só é usada se o upstream falhar
+cache = OrderedDict()
+max_cache_size = 10000  # Número máximo de entradas (alterado por --cache-size)
+SWEEP_INTERVAL = 100    # A cada quantas inserções o cache é varrido em busca de expiradas
+SWEEP_BATCH = 16        # Quantas entradas (as mais antigas) são verificadas por varredura
+_inserts = 0            # Contador de inserções desde a última varredura
+STALE_GRACE = 3600      # Tempo (s) que uma entrada vencida é mantida para uso em caso de falha
+STALE_TTL = 30          # TTL (s) escrito nas respostas vencidas enviadas ao cliente (RFC 8767)
+NEGATIVE_TTL = 300      # TTL máximo (s) para respostas negativas (NXDOMAIN, SERVFAIL, sem respostas)
+RECV_BATCH = 64         # Máximo de datagramas lidos do socket do servidor a cada despertar
+MAX_PENDING = 32768     # Máximo de consultas aguardando o upstream (metade dos IDs de 16 bits)
+_HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')  # Envio com vários buffers (indisponível no Windows)
+
+# Modos de operação, um por etapa do desafio:
+#   echo: apenas registra as mensagens recebidas (Etapa 1)
+#   parse: exibe o cabeçalho e as perguntas de cada solicitação (Etapa 2)
+#   forward: encaminha ao upstream e devolve a resposta ao cliente (Etapas 3 e 4)
+#   cache: como forward, respondendo do cache quando possível (Etapa 5)
+MODES = ('echo', 'parse', 'forward', 'cache')
+
+def parse_dns_header(data):
+    """
+    Parseia o cabeçalho de um pacote DNS (12 bytes, conforme RFC 1035, Seção 4.1.1).
+    Args:
+        data: Bytes do pacote DNS recebido.
+    Returns:
+        Tupla (id, flags, questions, answers, authorities, additionals): ID da transação,
+        flags e contagem de perguntas, respostas, registros de autoridade e adicionais.
+    """
+    # Desempacota os 12 bytes do cabeçalho em 6 campos de 16 bits (big-endian)
+    return _HDR.unpack_from(data, 0)
+
+def parse_dns_name(data, offset):
+    """
+    Parseia o nome do domínio codificado no pacote DNS.
+    Suporta compressão de nomes (ponteiros), seguindo-os de forma iterativa: no máximo
+    MAX_POINTER_HOPS saltos e MAX_NAME_LENGTH bytes, o que protege contra pacotes com
+    ponteiros em loop.
+    Args:
+        data: Bytes do pacote DNS.
+        offset: Posição inicial para leitura do nome.
+    Returns:
+        Tupla (nome do domínio como string, novo offset após o nome).
+    Raises:
+        ValueError: Se o nome tiver saltos demais ou passar do tamanho máximo.
+    """
+    name_parts = []
+    end = None  # Offset após o nome, fixado no primeiro ponteiro seguido
+    hops = 0
+    size = 0
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:  # Verifica se é um ponteiro de compressão
+            if end is None:
+                end = offset + 2
+            hops += 1
+            if hops > MAX_POINTER_HOPS:
+                raise ValueError("Ponteiros de compressão demais no nome DNS")
+            # Continua a leitura no ponteiro (14 bits, ignorando os 2 bits iniciais)
+            offset = _U16.unpack_from(data, offset)[0] & 0x3FFF
+            continue
+        offset += 1
+        if length == 0:  # Fim do nome (byte 0)
+            break
+        size += length + 1
+        if size > MAX_NAME_LENGTH:
+            raise ValueError("Nome DNS maior que o permitido")
+        # Lê o segmento do nome (ex.: 'www', 'google') e decodifica como ASCII; octetos fora
+        # do ASCII são válidos em rótulos DNS e aparecem escapados (ex.: 'caf\xc3\xa9')
+        name_parts.append(str(data[offset:offset+length], 'ascii', 'backslashreplace'))
+        offset += length
+    # Retorna nome (ex.: www.google.com) e novo offset
+    return '.'.join(name_parts), end if end is not None else offset
+
+def _qname_end(data, offset):
+    """
+    Percorre um nome codificado sem decodificá-lo (rótulos ou ponteiro de compressão).
+    Args:
+        data: Bytes do pacote DNS.
+        offset: Posição inicial do nome.
+    Returns:
+        Offset logo após o nome (após o byte 0 final ou após o ponteiro).
+    """
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:  # Ponteiro de compressão: 2 bytes encerram o nome
+            return offset + 2
+        offset += 1 + length
+        if length == 0:  # Fim do nome (byte 0)
+            return offset
+
+def parse_dns_question(data, offset):
+    """
+    Parseia a seção de perguntas do pacote DNS (RFC 1035, Seção 4.1.2).
+    Args:
+        data: Bytes do pacote DNS.
+        offset: Posição inicial da seção de perguntas.
+    Returns:
+        Tupla (nome, tipo, classe, novo offset), ex.: ('www.google.com', 1, 1, 32).
+    """
+    # Extrai o nome do domínio
+    name, offset = parse_dns_name(data, offset)
+    # Lê tipo (ex.: 1 para A) e classe (ex.: 1 para IN) como inteiros de 16 bits
+    qtype, qclass = _QT.unpack_from(data, offset)
+    return name, qtype, qclass, offset + 4
+
+def parse_dns_answer(data, offset):
+    """
+    Parseia a seção de respostas do pacote DNS (RFC 1035, Seção 4.1.3).
+    Args:
+        data: Bytes do pacote DNS.
+        offset: Posição inicial da seção de respostas.
+    Returns:
+        Tupla (nome, tipo, classe, TTL em segundos, dados da resposta, novo offset).
+    """
+    # Extrai o nome do domínio
+    name, offset = parse_dns_name(data, offset)
+    # Lê tipo, classe, TTL e comprimento dos dados
+    atype, aclass, ttl, rdlength = _ANS.unpack_from(data, offset)
+    offset += 10
+    # Lê os dados da resposta (ex.: endereço IP para registros A)
+    rdata = data[offset:offset+rdlength]
+    offset += rdlength
+    if atype == 1:  # Se for registro A (IPv4)
+        # Converte os 4 bytes do endereço IP em string (ex.: 142.250.78.132)
+        rdata = socket.inet_ntoa(rdata)
+    elif atype == 28:  # Se for registro AAAA (IPv6)
+        # Converte os 16 bytes do endereço IP em string (ex.: 2800:3f0:4001:80c::2004)
+        rdata = socket.inet_ntop(socket.AF_INET6, rdata)
+    return name, atype, aclass, ttl, rdata, offset
+
+def cache_key(data, qname_end=None):
+    """
+    Monta a chave do cache a partir da primeira pergunta do pacote, sem decodificar o nome.
+    A chave é a própria pergunta no formato do pacote: nome em minúsculas (nomes DNS não
+    diferenciam maiúsculas, RFC 1035, Seção 2.3.3) seguido de tipo e classe (4 bytes).
+    Args:
+        data: Bytes (ou memoryview) do pacote DNS, com ao menos uma pergunta.
+        qname_end: Offset logo após o nome da pergunta, se já conhecido (padrão: calculado).
+    Returns:
+        Chave do cache (bytes).
+    """
+    if qname_end is None:
+        qname_end = _qname_end(data, 12)
+    # Uma única cópia do nome (já em minúsculas, ao chamar lower) e uma concatenação
+    # direto da memoryview de tipo e classe; o resultado é bytes (imutável e hashable)
+    view = memoryview(data)
+    return view[12:qname_end].tobytes().lower() + view[qname_end:qname_end+4]
+
+def check_cache(key):
+    """
+    Verifica se a pergunta DNS está no cache e se o TTL ainda é válido.
+    Args:
+        key: Chave do cache da pergunta (ver cache_key).
+    Returns:
+        Tupla (resposta em cache (bytes), vencida (bool)), ou None se não houver entrada utilizável.
+        Uma resposta vencida só deve ser enviada se o upstream não responder.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        response, expiry, hard_expiry = entry
+        # Verifica se o TTL ainda é válido
+        now = time.monotonic()
+        if now < expiry:
+            cache.move_to_end(key)  # Marca como usada recentemente
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Resposta encontrada no cache (TTL restante: %d segundos)", expiry - now)
+            return response, False
+        elif now < hard_expiry:
+            log.debug("Resposta vencida no cache; consultando o upstream")
+            return response, True
+        else:
+            del cache[key]  # Remove entrada expirada
+            log.debug("Entrada expirada removida do cache")
+    return None
+
+def store_in_cache(key, response, ttl):
+    """
+    Armazena a resposta DNS no cache com base no TTL.
+    A entrada é mantida por mais STALE_GRACE segundos após vencer, para uso em caso de falha.
+    Args:
+        key: Chave do cache da pergunta (ver cache_key).
+        response: Pacote DNS completo (bytes) da resposta.
+        ttl: Tempo de validade da resposta, em segundos.
+    """
+    expiry = time.monotonic() + ttl
+    cache[key] = (response, expiry, expiry + STALE_GRACE)
+    cache.move_to_end(key)
+    # Descarta as entradas menos usadas se o cache passar do tamanho máximo
+    while len(cache) > max_cache_size:
+        cache.popitem(last=False)
+    global _inserts
+    _inserts += 1
+    if _inserts >= SWEEP_INTERVAL:
+        _inserts = 0
+        sweep_cache()
+    if log.isEnabledFor(logging.DEBUG):
+        try:
+            name = parse_dns_name(response, 12)[0]
+        except (IndexError, ValueError):
+            name = '?'
+        log.debug("Resposta armazenada no cache para %s com TTL %d segundos", name, ttl)
+
+def sweep_cache():
+    """
+    Remove entradas expiradas entre as mais antigas do cache (amortiza a limpeza
+    ao longo das inserções, sem percorrer o cache inteiro).
+    """
+    now = time.monotonic()
+    for key in list(islice(cache, SWEEP_BATCH)):
+        if cache[key][2] <= now:
+            del cache[key]
+
+def _scan_min_ttl(data, offset, count):
+    """
+    Obtém o menor TTL de uma sequência de registros lendo apenas os campos fixos de cada um
+    (tipo, classe, TTL e comprimento), sem decodificar nomes nem dados.
+    Args:
+        data: Bytes do pacote DNS.
+        offset: Posição do primeiro registro.
+        count: Número de registros.
+    Returns:
+        Tupla (menor TTL em segundos, ou None se não houver registros, offset após os registros).
+    """
+    min_ttl = None
+    unpack_from = _ANS.unpack_from
+    for _ in range(count):
+        # Quase sempre o nome do registro é só um ponteiro para a pergunta: pula direto
+        if data[offset] >= 0xC0:
+            offset += 2
+        else:
+            offset = _qname_end(data, offset)
+        _, _, ttl, rdlength = unpack_from(data, offset)
+        if min_ttl is None or ttl < min_ttl:
+            min_ttl = ttl
+        offset += 10 + rdlength
+    return min_ttl, offset
+
+def parse_dns_response(data, qname_end=None):
+    """
+    Extrai, em uma única passada pelo pacote, tudo o que o encaminhamento precisa de uma
+    resposta do upstream, sem decodificar nomes nem dados.
+    Args:
+        data: Bytes da resposta DNS.
+        qname_end: Offset logo após o nome da primeira pergunta, se já conhecido (ex.: pela
+            validação em UpstreamProtocol); o nome então não é percorrido de novo.
+    Returns:
+        Tupla (flags, menor TTL das respostas ou None, offset da seção de autoridade,
+        número de registros de autoridade).
+    """
+    _, flags, qdcount, ancount, nscount, _ = _HDR.unpack_from(data, 0)
+    offset = 12
+    if qdcount and qname_end is not None:
+        offset = qname_end + 4  # Primeira pergunta já percorrida: pula tipo e classe
+        qdcount -= 1
+    # Pula as (demais) perguntas: nome, tipo e classe
+    for _ in range(qdcount):
+        offset = _qname_end(data, offset) + 4
+    min_ttl, offset = _scan_min_ttl(data, offset, ancount)
+    return flags, min_ttl, offset, nscount
+
+def negative_ttl(data, offset, count):
+    """
+    Calcula o TTL de uma resposta negativa (RFC 2308, Seção 5): o menor valor entre o TTL
+    do registro SOA da seção de autoridade e o seu campo MINIMUM, limitado a NEGATIVE_TTL.
+    Args:
+        data: Bytes do pacote DNS.
+        offset: Posição inicial da seção de autoridade.
+        count: Número de registros de autoridade.
+    Returns:
+        TTL em segundos (NEGATIVE_TTL se não houver registro SOA).
+    """
+    for _ in range(count):
+        offset = _qname_end(data, offset)
+        atype, _, ttl, rdlength = _ANS.unpack_from(data, offset)
+        offset += 10 + rdlength
+        if atype == 6:  # Registro SOA: MINIMUM são os 4 últimos bytes dos dados
+            minimum = _U32.unpack_from(data, offset - 4)[0]
+            return min(ttl, minimum, NEGATIVE_TTL)
+    return NEGATIVE_TTL
+
+def stale_response(response, data):
+    """
+    Prepara uma resposta vencida do cache para envio: copia o ID da transação e o nome
+    da pergunta (com as maiúsculas/minúsculas do cliente) da solicitação e reescreve o
+    TTL de todos os registros para STALE_TTL.
+    Args:
+        response: Resposta vencida em cache (bytes).
+        data: Solicitação do cliente (bytes).
+    Returns:
+        Resposta pronta para envio (bytearray).
+    """
+    updated_response = bytearray(response)
+    updated_response[:2] = data[:2]
+    # A chave do cache é igual, então o nome tem o mesmo tamanho nos dois pacotes
+    qname_end = _qname_end(response, 12)
+    updated_response[12:qname_end] = data[12:qname_end]
+    _, _, qdcount, ancount, nscount, arcount = parse_dns_header(response)
+    offset = 12
+    for _ in range(qdcount):
+        offset = _qname_end(response, offset) + 4
+    for _ in range(ancount + nscount + arcount):
+        offset = _qname_end(response, offset)
+        atype, _, _, rdlength = _ANS.unpack_from(response, offset)
+        if atype != 41:  # No pseudo-registro OPT (EDNS) o campo TTL guarda flags
+            _U32.pack_into(updated_response, offset + 4, STALE_TTL)
+        offset += 10 + rdlength
+    return updated_response
+
+class UpstreamProtocol(asyncio.DatagramProtocol):
+    """
+    Protocolo do socket UDP compartilhado com o servidor DNS upstream.
+    Todas as consultas usam o mesmo socket; cada uma recebe um ID da transação próprio
+    (clientes diferentes podem usar o mesmo ID) e as respostas são entregues a quem
+    as aguarda por esse ID (2 primeiros bytes do pacote).
+    Como o socket sai sempre da mesma porta, o ID é sorteado com secrets (um gerador
+    previsível facilitaria respostas forjadas) e uma resposta só é aceita se a pergunta
+    for a mesma da consulta.
+    """
+    def __init__(self):
+        self.transport = None
+        # Formato: {id da transação no upstream (bytes): (Future, chave da pergunta ou None)}
+        self.pending = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def submit(self, data, key):
+        """
+        Envia uma consulta ao upstream com um ID da transação aleatório e livre.
+        Com MAX_PENDING consultas pendentes a consulta não é enviada: o sorteio de um ID
+        livre ficaria cada vez mais lento e, com todos os IDs em uso, não terminaria.
+        Args:
+            data: Pacote DNS da solicitação (bytes).
+            key: Chave do cache da pergunta da solicitação (ver cache_key), ou None se
+                não houver perguntas; a resposta precisa ter a mesma pergunta.
+        Returns:
+            Tupla (ID usado no upstream (bytes), Future resolvido com a tupla (resposta,
+            offset após o nome da primeira pergunta ou None)), ou None
+            se houver consultas pendentes demais.
+        """
+        if len(self.pending) >= MAX_PENDING:
+            return None
+        while True:
+            upstream_id = _U16.pack(secrets.randbits(16))
+            if upstream_id not in self.pending:
+                break
+        # Registra o Future antes de enviar, para não perder uma resposta rápida
+        future = asyncio.get_running_loop().create_future()
+        self.pending[upstream_id] = (future, key)
+        self.transport.sendto(upstream_id + memoryview(data)[2:])
+        return upstream_id, future
+
+    def datagram_received(self, data, addr):
+        # Resolve o Future da consulta que possui o mesmo ID da transação
+        entry = self.pending.get(data[:2])
+        if entry is None:
+            return
+        future, key = entry
+        # A pergunta da resposta deve ser a da consulta (sem diferenciar maiúsculas);
+        # senão a resposta é ignorada e a consulta continua aguardando a verdadeira
+        try:
+            if data[4] or data[5]:
+                qname_end = _qname_end(data, 12)
+                matches = cache_key(data, qname_end) == key
+            else:
+                qname_end = None
+                matches = key is None
+        except (IndexError, ValueError, struct.error):
+            matches = False
+        if not matches:
+            log.debug("Resposta do upstream com pergunta diferente da consulta descartada")
+            return
+        del self.pending[data[:2]]
+        if not future.done():
+            # O fim do nome segue junto, para parse_dns_response não percorrê-lo de novo
+            future.set_result((data, qname_end))
+
+    def error_received(self, exc):
+        log.warning("Erro no socket upstream: %s", exc)
+
+def send_response(server_socket, response, client_address):
+    """
+    Envia uma resposta ao cliente; uma falha no envio (ex.: buffer cheio, firewall) descarta
+    apenas esta resposta, sem interromper o servidor.
+    Args:
+        server_socket: Socket do servidor.
+        response: Pacote DNS da resposta.
+        client_address: Endereço do cliente (IP, porta).
+    Returns:
+        True se a resposta foi enviada.
+    """
+    try:
+        server_socket.sendto(response, client_address)
+    except OSError as exc:
+        log.debug("Erro ao enviar resposta para %s: %s", client_address, exc)
+        return False
+    return True
+
+def send_stale(server_socket, stale, data, client_address):
+    """
+    Envia ao cliente uma resposta vencida do cache (ver stale_response).
+    Args:
+        server_socket: Socket do servidor.
+        stale: Resposta vencida em cache (bytes).
+        data: Solicitação do cliente (bytes).
+        client_address: Endereço do cliente (IP, porta).
+    """
+    try:
+        response = stale_response(stale, data)
+    except (IndexError, ValueError, struct.error):
+        log.debug("Resposta vencida malformada no cache; nada enviado para %s", client_address)
+        return
+    if send_response(server_socket, response, client_address):
+        log.debug("Resposta vencida enviada do cache para %s", client_address)
+
+async def forward_request(data, client_address, server_socket, upstream, key, stale=None, timeout=5,
+                          use_cache=True):
+    """
+    Encaminha a solicitação DNS para o servidor upstream (ex.: Google DNS) e processa a resposta.
+    Args:
+        data: Pacote DNS recebido (bytes).
+        client_address: Endereço do cliente (IP, porta).
+        server_socket: Socket do servidor para enviar respostas.
+        upstream: UpstreamProtocol conectado ao servidor DNS upstream.
+        key: Chave do cache da pergunta da solicitação (ver cache_key), ou None se não houver
+            perguntas. A resposta é armazenada sob esta chave.
+        stale: Resposta vencida do cache, enviada se o upstream falhar (padrão: None).
+        timeout: Tempo máximo de espera pela resposta, em segundos (padrão: 5).
+        use_cache: Armazena a resposta no cache (padrão: True; False no modo forward).
+    """
+    submitted = upstream.submit(data, key)
+    if submitted is None:
+        # Upstream sobrecarregado: a consulta é descartada (o cliente pode repeti-la)
+        log.debug("Consultas pendentes demais; solicitação de %s descartada", client_address)
+        if stale is not None:
+            send_stale(server_socket, stale, data, client_address)
+        return
+    upstream_id, future = submitted
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Solicitação encaminhada para %s", upstream.transport.get_extra_info('peername')[0])
+
+    try:
+        # Aguarda a resposta sem bloquear as demais consultas
+        response, qname_end = await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        upstream.pending.pop(upstream_id, None)
+        log.warning("Timeout ao esperar resposta do servidor DNS")
+        if stale is not None:
+            # Usa a resposta vencida do cache em vez de deixar o cliente sem resposta
+            send_stale(server_socket, stale, data, client_address)
+        return
+
+    # Restaura o ID da transação do cliente
+    response = data[:2] + memoryview(response)[2:]
+
+    ttl = None  # TTL da entrada no cache (None: resposta não é armazenada)
+    if use_cache:
+        try:
+            # Parseia a resposta de uma só vez (cabeçalho, pergunta e menor TTL das respostas)
+            flags, min_ttl, offset, nscount = parse_dns_response(response, qname_end)
+            rcode = flags & 0x000F  # Código de resposta (0: sucesso, 2: SERVFAIL, 3: NXDOMAIN)
+            if rcode == 2 and stale is not None:
+                # Falha no upstream: a resposta vencida é preferível a um SERVFAIL
+                send_stale(server_socket, stale, data, client_address)
+                return
+            # A pergunta da resposta já foi comparada à da solicitação (UpstreamProtocol)
+            if key is not None:
+                if rcode == 0 and min_ttl is not None:
+                    ttl = min_ttl
+                elif rcode in (0, 2, 3):
+                    # Resposta negativa (sem respostas, SERVFAIL ou NXDOMAIN): TTL vem do SOA
+                    ttl = negative_ttl(response, offset, nscount)
+        except (IndexError, ValueError, struct.error):
+            # Resposta malformada do upstream: repassada ao cliente, mas fora do cache
+            ttl = None
+            log.debug("Resposta malformada do upstream não armazenada no cache")
+    if ttl is not None:
+        store_in_cache(key, response, ttl)
+    # Envia a resposta ao cliente original
+    if send_response(server_socket, response, client_address):
+        log.debug("Resposta enviada para %s", client_address)
+
+class DNSServer:
+    """
+    Servidor DNS: lê as solicitações do socket em lotes, responde na hora as que estão
+    no cache e cria uma tarefa para cada uma que precisa ir ao upstream, de modo que
+    várias consultas ao upstream podem estar em andamento ao mesmo tempo.
+    """
+    def __init__(self, server_socket, upstream, use_cache=True):
+        self.socket = server_socket  # Socket UDP não bloqueante do servidor
+        self.upstream = upstream
+        self.use_cache = use_cache  # False no modo forward: toda consulta vai ao upstream
+        self.tasks = set()  # Referências às tarefas em andamento (evita coleta pelo GC)
+        # Buffer de recepção reutilizado por todos os pacotes (tamanho de um MTU Ethernet)
+        self.buffer = bytearray(1500)
+        self.view = memoryview(self.buffer)
+
+    async def receive_forever(self):
+        """
+        Recebe solicitações para sempre, em lotes de até RECV_BATCH datagramas já
+        enfileirados no socket; após cada lote o controle volta ao loop de eventos, para que
+        as tarefas de encaminhamento, as respostas do upstream e os timeouts avancem.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # Aguarda o primeiro datagrama pelo loop de eventos...
+                nbytes, addr = await loop.sock_recvfrom_into(self.socket, self.buffer)
+                self.datagram_received(nbytes, addr)
+                # ...e lê os que já chegaram sem voltar ao loop de eventos
+                for _ in range(RECV_BATCH - 1):
+                    nbytes, addr = self.socket.recvfrom_into(self.buffer)
+                    self.datagram_received(nbytes, addr)
+            except BlockingIOError:
+                pass  # Fila do socket vazia
+            except ConnectionResetError:
+                pass  # Windows: erro ICMP de um envio anterior; o socket continua válido
+            # Com datagramas na fila, sock_recvfrom_into lê na hora sem ceder o controle:
+            # cede explicitamente, senão o lote só terminaria com a fila do socket vazia
+            await asyncio.sleep(0)
+
+    def datagram_received(self, nbytes, addr):
+        try:
+            # O pacote é lido direto do buffer, sem cópia
+            self.handle_query(self.view[:nbytes], addr)
+        except (IndexError, ValueError, struct.error):
+            log.debug("Pacote DNS malformado descartado de %s", addr)
+
+    def handle_query(self, data, client_address):
+        """
+        Processa uma solicitação DNS: responde do cache (se ativo) ou encaminha ao upstream.
+        Args:
+            data: Pacote DNS recebido (memoryview do buffer de recepção, válida só até
+                o próximo recebimento; é copiada para bytes se precisar ir ao upstream).
+            client_address: Endereço do cliente (IP, porta).
+        """
+        debug = log.isEnabledFor(logging.DEBUG)
+        if debug:
+            log.debug("Mensagem recebida de %s", client_address)
+
+        # Caso comum (praticamente toda consulta real): exatamente uma pergunta. O contador
+        # é lido direto dos bytes 4-5, sem parsear o cabeçalho inteiro
+        if data[4] == 0 and data[5] == 1:
+            qdcount = 1
+        else:
+            qdcount = parse_dns_header(data)[2]
+        if debug:
+            offset = 12
+            # Parseia todas as perguntas da solicitação (apenas para depuração); um erro aqui
+            # não pode descartar a consulta, que é atendida normalmente sem --debug
+            try:
+                for _ in range(qdcount):
+                    name, qtype, qclass, offset = parse_dns_question(data, offset)
+                    log.debug("Pergunta - nome:%s tipo:%s classe:%s", name, qtype, qclass)
+            except (IndexError, ValueError, struct.error):
+                log.debug("Pergunta que não pôde ser exibida")
+
+        # Verifica se há uma resposta no cache para a primeira pergunta
+        stale = None
+        key = cache_key(data) if qdcount else None
+        if key is not None and self.use_cache:
+            cached = check_cache(key)
+            if cached and not cached[1]:
+                cached_response = memoryview(cached[0])
+                # A chave é a pergunta inteira (12 bytes de cabeçalho + nome + 4 bytes de tipo
+                # e classe), então o nome termina na mesma posição na solicitação e na resposta
+                qname_end = len(key) + 8
+                # A chave ignora maiúsculas, mas o cliente espera a pergunta exatamente como
+                # enviou (ex.: DNS 0x20): o nome vem da solicitação, não da resposta em cache
+                try:
+                    if _HAS_SENDMSG:
+                        # Envia o ID da transação e o nome da solicitação intercalados com o restante
+                        # da resposta em cache; o kernel junta os trechos em um só datagrama, sem cópias
+                        self.socket.sendmsg([data[:2], cached_response[2:12], data[12:qname_end],
+                                             cached_response[qname_end:]], (), 0, client_address)
+                    else:
+                        # Cria uma cópia modificável da resposta em cache
+                        updated_response = bytearray(cached_response)
+                        # Atualiza o ID da transação e o nome para corresponderem à solicitação
+                        updated_response[:2] = data[:2]
+                        updated_response[12:qname_end] = data[12:qname_end]
+                        # Envia a resposta atualizada ao cliente
+                        self.socket.sendto(updated_response, client_address)
+                except OSError as exc:
+                    # Falha no envio (ex.: buffer cheio, firewall): descarta só esta resposta;
+                    # o cliente repete a consulta e o servidor continua atendendo
+                    log.debug("Erro ao enviar resposta para %s: %s", client_address, exc)
+                    return
+                if debug:
+                    log.debug("Resposta enviada do cache para %s", client_address)
+                return
+            elif cached:
+                stale = cached[0]  # Vencida: usada apenas se o upstream falhar
+
+        # Se não houver resposta no cache, encaminha a solicitação
+        task = asyncio.create_task(
+            forward_request(bytes(data), client_address, self.socket, self.upstream, key, stale,
+                            use_cache=self.use_cache))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+async def serve(server_socket, upstream_dns='8.8.8.8', upstream_port=53, use_cache=True):
+    """
+    Cria o socket do upstream no loop de eventos e atende o socket do servidor para sempre.
+    Args:
+        server_socket: Socket UDP do servidor, já vinculado à porta (ver bind_server_socket).
+        upstream_dns: Endereço do servidor DNS upstream (padrão: 8.8.8.8).
+        upstream_port: Porta do servidor DNS upstream (padrão: 53).
+        use_cache: Responde do cache quando possível (padrão: True).
+    """
+    loop = asyncio.get_running_loop()
+    # Um único socket upstream, reutilizado por todas as consultas
+    upstream_transport, upstream = await loop.create_datagram_endpoint(
+        UpstreamProtocol, remote_addr=(upstream_dns, upstream_port))
+
+    try:
+        await DNSServer(server_socket, upstream, use_cache).receive_forever()
+    finally:
+        server_socket.close()
+        upstream_transport.close()
+
+def inspect_forever(server_socket, parse=False):
+    """
+    Modos echo e parse: recebe solicitações para sempre e apenas as exibe, sem responder.
+    Args:
+        server_socket: Socket UDP do servidor, já vinculado à porta (ver bind_server_socket).
+        parse: Exibe também o cabeçalho e as perguntas de cada pacote (padrão: False).
+    """
+    server_socket.setblocking(True)
+    while True:
+        data, client_address = server_socket.recvfrom(1500)
+        print("Mensagem recebida de", client_address)
+        if not parse:
+            continue
+        try:
+            tid, flags, qdcount, ancount, nscount, arcount = parse_dns_header(data)
+            print(f"Cabeçalho - id:{tid} flags:{flags} "
+                  f"questions:{qdcount} answers:{ancount} "
+                  f"authorities:{nscount} additionals:{arcount}")
+            offset = 12  # Após o cabeçalho
+            for _ in range(qdcount):
+                name, qtype, qclass, offset = parse_dns_question(data, offset)
+                print(f"Pergunta - nome:{name} tipo:{qtype} classe:{qclass}")
+        except (IndexError, ValueError, struct.error):
+            print("Pacote DNS malformado")
+
+def run(server_socket, mode='cache', upstream_dns='8.8.8.8', upstream_port=53):
+    """
+    Atende o socket do servidor para sempre no modo indicado (ver MODES).
+    Args:
+        server_socket: Socket UDP do servidor, já vinculado à porta (ver bind_server_socket).
+        mode: Modo de operação (padrão: 'cache').
+        upstream_dns: Endereço do servidor DNS upstream (padrão: 8.8.8.8).
+        upstream_port: Porta do servidor DNS upstream (padrão: 53).
+    """
+    if mode in ('echo', 'parse'):
+        inspect_forever(server_socket, parse=mode == 'parse')
+    else:
+        asyncio.run(serve(server_socket, upstream_dns, upstream_port, use_cache=mode == 'cache'))
+
+def bind_server_socket(port, reuse_port=False):
+    """
+    Cria o socket UDP não bloqueante do servidor, que recebe as solicitações dos clientes.
+    Args:
+        port: Porta para escutar (ex.: 1053).
+        reuse_port: Ativa SO_REUSEPORT, permitindo vários sockets na mesma porta; o kernel
+            distribui os datagramas entre eles (padrão: False).
+    Returns:
+        Socket vinculado a 127.0.0.1 na porta indicada.
+    """
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuse_port:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server_socket.bind(('127.0.0.1', port))
+    server_socket.setblocking(False)
+    return server_socket
+
+def start_server(port, mode='cache', upstream_dns='8.8.8.8', upstream_port=53, cache_size=10000,
+                 workers=1):
+    """
+    Inicia o servidor DNS Forwarder, escutando na porta especificada.
+    Args:
+        port: Porta para escutar (ex.: 1053).
+        mode: Modo de operação: 'echo', 'parse', 'forward' ou 'cache' (padrão: 'cache').
+        upstream_dns: Endereço do servidor DNS upstream (padrão: 8.8.8.8).
+        upstream_port: Porta do servidor DNS upstream (padrão: 53).
+        cache_size: Número máximo de respostas no cache (padrão: 10000).
+        workers: Número de processos; com mais de 1, cada processo tem o próprio socket
+            (SO_REUSEPORT) e o próprio cache, contornando o GIL (padrão: 1).
+    """
+    if mode not in MODES:
+        raise ValueError(f"Modo desconhecido: {mode}")
+    if cache_size < 0:
+        raise ValueError("O tamanho do cache não pode ser negativo")
+    if workers < 1:
+        raise ValueError("É necessário ao menos 1 processo")
+    global max_cache_size
+    max_cache_size = cache_size
+    if workers > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        log.warning("Vários processos exigem os.fork e SO_REUSEPORT (Linux); usando apenas 1")
+        workers = 1
+
+    # Os sockets são criados antes do fork para que erros (ex.: porta em uso) apareçam aqui
+    sockets = [bind_server_socket(port, reuse_port=workers > 1) for _ in range(workers)]
+    # Esvazia a saída antes do fork: senão cada filho herdaria o buffer e repetiria a mensagem
+    print(f"Servidor DNS ouvindo na porta {port}...", flush=True)
+    if workers == 1:
+        run(sockets[0], mode, upstream_dns, upstream_port)
+        return
+
+    children = []
+    for server_socket in sockets:
+        pid = os.fork()
+        if pid == 0:
+            # Processo filho: usa apenas o seu socket e cria o próprio loop de eventos
+            for other in sockets:
+                if other is not server_socket:
+                    other.close()
+            status = 0
+            try:
+                run(server_socket, mode, upstream_dns, upstream_port)
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                # os._exit não exibe exceções: sem isto o filho terminaria em silêncio
+                traceback.print_exc()
+                status = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(status)
+        children.append(pid)
+    for server_socket in sockets:
+        server_socket.close()  # O processo pai apenas aguarda os filhos
+
+    # SIGTERM no pai é tratado como Ctrl+C, para não deixar filhos órfãos
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        for pid in children:
+            _, status = os.waitpid(pid, 0)
+            if status:
+                log.warning("Processo %d encerrado com erro (código %d)",
+                            pid, os.waitstatus_to_exitcode(status))
+    except KeyboardInterrupt:
+        # Encerra os filhos (com Ctrl+C no terminal eles também já recebem o sinal)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+def int_at_least(minimum):
+    """
+    Cria um tipo para argparse que aceita apenas inteiros maiores ou iguais a minimum.
+    Args:
+        minimum: Menor valor aceito.
+    Returns:
+        Função de conversão para o parâmetro type de add_argument.
+    """
+    def convert(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"valor inteiro inválido: {value!r}")
+        if number < minimum:
+            raise argparse.ArgumentTypeError(f"deve ser maior ou igual a {minimum}")
+        return number
+    return convert
+
+def main(mode='cache', description="DNS Forwarder"):
+    """
+    Processa os argumentos de linha de comando e inicia o servidor.
+    Args:
+        mode: Modo usado quando --mode não é informado (padrão: 'cache').
+        description: Descrição exibida em --help (ex.: "DNS Forwarder - Etapa 1").
+    """
+    # Configura o parser para argumentos de linha de comando
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--port', type=int, default=1053, help="Porta para ouvir (padrão: 1053)")
+    parser.add_argument('--mode', choices=MODES, default=mode,
+                        help=f"Modo de operação (padrão: {mode})")
+    parser.add_argument('--cache-size', type=int_at_least(0), default=10000,
+                        help="Número máximo de respostas no cache (padrão: 10000)")
+    parser.add_argument('--workers', type=int_at_least(1), default=1,
+                        help="Número de processos atendendo a porta (padrão: 1; requer Linux)")
+    parser.add_argument('--debug', action='store_true',
+                        help="Exibe mensagens de depuração para cada pacote (reduz o desempenho)")
+    args = parser.parse_args()
+
+    # Sem --debug, apenas avisos (ex.: timeouts) são exibidos
+    logging.basicConfig(format='%(message)s')
+    log.setLevel(logging.DEBUG if args.debug else logging.WARNING)
+
+    # Inicia o servidor na porta especificada
+    start_server(args.port, args.mode, cache_size=args.cache_size, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
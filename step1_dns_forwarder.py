@@ -1,21 +1,6 @@
-import socket
-import argparse
-
-def start_server(port):
-    # Criar socket UDP
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    server_socket.bind(('127.0.0.1', port))
-    print(f"Servidor DNS ouvindo na porta {port}...")
-
-    while True:
-        # Receber dados
-        data, client_address = server_socket.recvfrom(1024)
-        print("Mensagem recebida de", client_address)
+# Etapa 1: servidor UDP básico que apenas registra as mensagens recebidas.
+# A implementação fica em dns_forwarder.py; este arquivo apenas a inicia no modo echo.
+from dns_forwarder import main
 
 if __name__ == "__main__":
-    # Configurar argumento de linha de comando para a porta
-    parser = argparse.ArgumentParser(description="DNS Forwarder")
-    parser.add_argument('--port', type=int, default=1053, help="Porta para ouvir (padrão: 1053)")
-    args = parser.parse_args()
-    
-    start_server(args.port)
\ No newline at end of file
+    main('echo', "DNS Forwarder - Etapa 1")